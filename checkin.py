@@ -5,36 +5,92 @@ AnyRouter.top 自动签到脚本
 
 import asyncio
 import json
+import logging
 import os
+import queue
+import random
 import sys
 import time
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from html import escape
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from typing import TypedDict
+from typing import Awaitable, TypedDict, TypeVar
 
 import httpx
+import orjson
 from dotenv import load_dotenv
-from playwright.async_api import Browser, async_playwright
+from playwright.async_api import Browser, Cookie, async_playwright
 
 from notify import notify
 
 # ============ 配置常量 ============
 ANYROUTER_BASE_URL = 'https://anyrouter.top'
 BEIJING_TZ = timezone(timedelta(hours=8))  # 北京时区 UTC+8
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
 WAF_COOKIE_NAMES = ['acw_tc', 'cdn_sec_tc', 'acw_sc__v2']
+WAF_COOKIE_SET = frozenset(WAF_COOKIE_NAMES)
 DEFAULT_TIMEOUT = 30.0
+CONNECT_TIMEOUT = 10.0
+# 客户端级超时对象，所有请求共用；连接超时更短，目标不可达时尽快失败
+HTTP_TIMEOUT = httpx.Timeout(DEFAULT_TIMEOUT, connect=CONNECT_TIMEOUT)
+# 每个账号一个客户端，请求经 HTTP/2 复用同一连接；延长 keep-alive 以免重试退避期间连接被回收
+HTTP_LIMITS = httpx.Limits(max_connections=10, max_keepalive_connections=10, keepalive_expiry=30.0)
+TRANSPORT_RETRIES = 2  # 连接建立失败时由 httpx transport 自动重试
 MAX_RETRIES = 3
 RETRY_BASE_DELAY = 1.0
+MAX_BACKOFF = 15.0  # 单次重试等待上限（秒）
 # WAF cookies 缓存配置
 WAF_CACHE_FILE = Path('.waf_cache.json')
 WAF_CACHE_TTL = timedelta(hours=2)  # 缓存有效期 2 小时
+# Chromium 启动参数：关闭 GPU、扩展及后台服务以降低内存占用
+BROWSER_LAUNCH_ARGS = [
+	'--disable-blink-features=AutomationControlled',
+	'--disable-dev-shm-usage',
+	'--disable-features=VizDisplayCompositor',
+	'--no-sandbox',
+	'--disable-gpu',
+	'--disable-extensions',
+	'--disable-background-networking',
+	'--disable-sync',
+	'--disable-translate',
+	'--mute-audio',
+	'--no-first-run',
+	'--no-default-browser-check',
+]
+# WAF cookies 获取配置：页面 DOM 就绪后轮询 cookies，最多等待 20 × 0.25 = 5 秒
+WAF_PAGE_TIMEOUT_MS = 10_000
+WAF_POLL_ATTEMPTS = 20
+WAF_POLL_INTERVAL = 0.25
+ACCOUNT_REQUIRED_KEYS = frozenset({'cookies', 'api_user'})
 QUOTA_PER_UNIT = 500000  # new-api/one-api 内部单位：1 USD = 500000
 
 DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36'
 
+# 所有账号共用的静态请求头，按账号仅补充 new-api-user
+BASE_HEADERS: dict[str, str] = {
+	'User-Agent': DEFAULT_USER_AGENT,
+	'Accept': 'application/json, text/plain, */*',
+	'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+	'Accept-Encoding': 'gzip, deflate, br, zstd',
+	'Referer': f'{ANYROUTER_BASE_URL}/console',
+	'Origin': ANYROUTER_BASE_URL,
+	'Connection': 'keep-alive',
+	'Sec-Fetch-Dest': 'empty',
+	'Sec-Fetch-Mode': 'cors',
+	'Sec-Fetch-Site': 'same-origin',
+}
+CHECKIN_EXTRA_HEADERS: dict[str, str] = {'Content-Type': 'application/json', 'X-Requested-With': 'XMLHttpRequest'}
+
+
+logger = logging.getLogger('anyrouter')
+
 
 # ============ 类型定义 ============
+T = TypeVar('T')
+
+
 class AccountConfig(TypedDict):
 	cookies: str | dict[str, str]
 	api_user: str
@@ -55,9 +111,22 @@ class CheckinResult(TypedDict):
 
 
 # ============ 工具函数 ============
+def setup_logging() -> QueueListener:
+	"""配置账号处理日志：协程只把记录放入队列，由后台线程统一写到 stdout"""
+	log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+	stream_handler = logging.StreamHandler(sys.stdout)
+	stream_handler.setFormatter(logging.Formatter('%(message)s'))
+	logger.addHandler(QueueHandler(log_queue))
+	logger.setLevel(logging.INFO)
+	logger.propagate = False
+	listener = QueueListener(log_queue, stream_handler)
+	listener.start()
+	return listener
+
+
 def get_beijing_time() -> str:
 	"""获取北京时间字符串"""
-	return datetime.now(BEIJING_TZ).strftime('%Y-%m-%d %H:%M:%S')
+	return datetime.now(BEIJING_TZ).strftime(TIME_FORMAT)
 
 
 def load_waf_cache() -> dict[str, str] | None:
@@ -73,11 +142,17 @@ def load_waf_cache() -> dict[str, str] | None:
 			cached_time = cached_time.replace(tzinfo=BEIJING_TZ)
 		cookies = cache_data.get('cookies', {})
 
+		# 缓存有效期取 TTL 与 cookies 自身最早过期时间中较早者
+		expires_at = cached_time + WAF_CACHE_TTL
+		cookie_expires = cache_data.get('expires')
+		if cookie_expires:
+			expires_at = min(expires_at, datetime.fromtimestamp(cookie_expires, BEIJING_TZ))
+
 		# 检查缓存是否过期
-		if datetime.now(BEIJING_TZ) - cached_time < WAF_CACHE_TTL:
+		if datetime.now(BEIJING_TZ) < expires_at:
 			# 验证缓存是否包含所有必需的 cookies
-			if all(name in cookies for name in WAF_COOKIE_NAMES):
-				print(f'[缓存] 使用缓存的 WAF cookies (过期时间: {cached_time.strftime("%Y-%m-%d %H:%M:%S")})')
+			if WAF_COOKIE_SET <= cookies.keys():
+				print(f'[缓存] 使用缓存的 WAF cookies (过期时间: {expires_at.strftime(TIME_FORMAT)})')
 				return cookies
 			else:
 				print('[缓存] 缓存的 cookies 不完整，将重新获取')
@@ -89,11 +164,12 @@ def load_waf_cache() -> dict[str, str] | None:
 	return None
 
 
-def save_waf_cache(cookies: dict[str, str]) -> None:
-	"""保存 WAF cookies 到缓存文件"""
+def save_waf_cache(cookies: dict[str, str], expires: float | None = None) -> None:
+	"""保存 WAF cookies 到缓存文件，expires 为 cookies 中最早的过期时间戳（会话 cookie 为 None）"""
 	try:
 		cache_data = {
 			'timestamp': datetime.now(BEIJING_TZ).isoformat(),
+			'expires': expires,
 			'cookies': cookies,
 		}
 		WAF_CACHE_FILE.write_text(json.dumps(cache_data, ensure_ascii=False, indent=2), encoding='utf-8')
@@ -102,8 +178,15 @@ def save_waf_cache(cookies: dict[str, str]) -> None:
 		print(f'[缓存] 保存缓存文件失败: {e}')
 
 
-def build_html_notification(results: list[CheckinResult | BaseException], success_count: int, skipped_count: int, total_count: int) -> str:
-	"""构建实际发送使用的 HTML 通知内容"""
+def build_html_notification(
+	results: list[CheckinResult | BaseException],
+	success_count: int,
+	skipped_count: int,
+	total_count: int,
+	run_time: str | None = None,
+) -> str:
+	"""构建实际发送使用的 HTML 通知内容，run_time 为执行时间（默认取当前北京时间）"""
+	run_time = run_time or get_beijing_time()
 	fail_count = total_count - success_count - skipped_count
 	status_meta = {
 		'success': {
@@ -237,7 +320,7 @@ def build_html_notification(results: list[CheckinResult | BaseException], succes
 			<div style="text-align: center; padding: 34px 26px 28px; background: linear-gradient(135deg, #36b66f 0%, #1f9b66 54%, #14785c 100%); color: #ffffff;">
 				<span style="display: inline-block; padding: 6px 12px; border-radius: 999px; border: 1px solid rgba(255, 255, 255, 0.20); background: rgba(255, 255, 255, 0.14); font-size: 11px; letter-spacing: 1.1px; font-weight: 700;">ANYROUTER DAILY CHECK-IN</span>
 				<h1 style="margin: 16px 0 0; font-size: 30px; line-height: 1.15; letter-spacing: 0.3px; font-weight: 700; color: #ffffff;">签到结果通知</h1>
-				<p style="margin: 10px 0 0; font-size: 14px; color: rgba(255, 255, 255, 0.92);">执行时间: {get_beijing_time()} (北京时间)</p>
+				<p style="margin: 10px 0 0; font-size: 14px; color: rgba(255, 255, 255, 0.92);">执行时间: {run_time} (北京时间)</p>
 				<span style="display: inline-block; margin-top: 16px; padding: 8px 14px; border-radius: 999px; font-size: 13px; font-weight: 700; background: {overall_badge_bg}; color: {overall_badge_color}; border: 1px solid {overall_badge_border};">{overall_status}</span>
 			</div>
 
@@ -267,9 +350,14 @@ def calculate_actual_reward(balance_before: BalanceInfo | None, balance_after: B
 
 
 def build_plain_text_notification(
-	results: list[CheckinResult | BaseException], success_count: int, skipped_count: int, total_count: int
+	results: list[CheckinResult | BaseException],
+	success_count: int,
+	skipped_count: int,
+	total_count: int,
+	run_time: str | None = None,
 ) -> str:
 	"""构建适合息知等纯文本通道的结构化通知内容。"""
+	run_time = run_time or get_beijing_time()
 	fail_count = total_count - success_count - skipped_count
 
 	if success_count == total_count:
@@ -283,7 +371,7 @@ def build_plain_text_notification(
 
 	lines = [
 		overall_status,
-		f'时间：{get_beijing_time()}（北京时间）',
+		f'时间：{run_time}（北京时间）',
 		'',
 		'统计：',
 		f'- 成功：{success_count}/{total_count}',
@@ -329,30 +417,32 @@ def build_plain_text_notification(
 	return '\n\n'.join(sections)
 
 
+@lru_cache(maxsize=128)
+def _stars(count: int) -> str:
+	"""返回指定长度的掩码字符串（按长度缓存）"""
+	return '*' * count
+
+
 def mask_sensitive(value: str, visible_chars: int = 4) -> str:
 	"""脱敏敏感信息，保留首尾字符"""
 	if not value:
 		return '***'
 	if len(value) <= visible_chars * 2:
-		return '*' * len(value)
-	return value[:visible_chars] + '*' * (len(value) - visible_chars * 2) + value[-visible_chars:]
+		return _stars(len(value))
+	return value[:visible_chars] + _stars(len(value) - visible_chars * 2) + value[-visible_chars:]
 
 
-async def retry_async(coro_func, max_retries: int = MAX_RETRIES, base_delay: float = RETRY_BASE_DELAY):
-	"""异步重试装饰器，支持指数退避"""
-	last_exception = None
-	for attempt in range(max_retries):
-		try:
-			return await coro_func()
-		except httpx.HTTPError as e:
-			last_exception = e
-			if attempt < max_retries - 1:
-				delay = base_delay * (2 ** attempt)
-				print(f'[重试] 第 {attempt + 1} 次失败，{delay}秒后重试...')
-				await asyncio.sleep(delay)
-	if last_exception is not None:
-		raise last_exception
-	raise RuntimeError('retry_async 执行结束但未捕获到可抛出的异常')
+def get_backoff_delay(attempt: int, base_delay: float = RETRY_BASE_DELAY) -> float:
+	"""计算第 attempt 次重试的等待时间：指数退避并封顶，再乘以 0.5~1.5 的随机抖动避免同步重试"""
+	return min(MAX_BACKOFF, base_delay * (2**attempt)) * random.uniform(0.5, 1.5)
+
+
+async def capture_exception(coro: Awaitable[T]) -> T | Exception:
+	"""等待协程并将异常作为结果返回，避免单个账号出错导致 TaskGroup 取消其余任务"""
+	try:
+		return await coro
+	except Exception as e:
+		return e
 
 
 def load_accounts():
@@ -363,21 +453,25 @@ def load_accounts():
 		return None
 
 	try:
-		accounts_data = json.loads(accounts_str)
+		accounts_data = orjson.loads(accounts_str)
 
 		# 检查是否为数组格式
 		if not isinstance(accounts_data, list):
 			print('[错误] 账号配置必须使用数组格式 [{}]')
 			return None
 
-		# 验证账号数据格式
-		for i, account in enumerate(accounts_data):
-			if not isinstance(account, dict):
-				print(f'[错误] 账号 {i + 1} 配置格式不正确')
-				return None
-			if 'cookies' not in account or 'api_user' not in account:
-				print(f'[错误] 账号 {i + 1} 缺少必需字段 (cookies, api_user)')
-				return None
+		# 验证账号数据格式：一次遍历定位首个不合法的账号
+		invalid_index = next(
+			(
+				i
+				for i, account in enumerate(accounts_data)
+				if not isinstance(account, dict) or not ACCOUNT_REQUIRED_KEYS <= account.keys()
+			),
+			None,
+		)
+		if invalid_index is not None:
+			print(f'[错误] 账号 {invalid_index + 1} 配置格式不正确，需为包含 cookies、api_user 字段的对象')
+			return None
 
 		return accounts_data
 	except Exception as e:
@@ -391,53 +485,61 @@ def parse_cookies(cookies_data):
 		return cookies_data
 
 	if isinstance(cookies_data, str):
-		cookies_dict = {}
-		for cookie in cookies_data.split(';'):
-			if '=' in cookie:
-				key, value = cookie.strip().split('=', 1)
-				cookies_dict[key] = value
-		return cookies_dict
+		# partition 一次完成查找与切分，sep 为空表示该片段不含 '='
+		return {
+			key.strip(): value.strip()
+			for key, sep, value in (cookie.partition('=') for cookie in cookies_data.split(';'))
+			if sep
+		}
 	print(f'[警告] cookies 数据类型无效 ({type(cookies_data).__name__})，期望 dict 或 str')
 	return {}
 
-async def precheck_account(account_info: AccountConfig, account_index: int) -> tuple[bool, str | None]:
+
+def create_client(cookies: dict[str, str]) -> httpx.AsyncClient:
+	"""创建单个账号使用的 HTTP/2 异步客户端"""
+	transport = httpx.AsyncHTTPTransport(http2=True, limits=HTTP_LIMITS, retries=TRANSPORT_RETRIES)
+	return httpx.AsyncClient(transport=transport, timeout=HTTP_TIMEOUT, cookies=cookies)
+
+
+async def precheck_account(account_info: AccountConfig, account_index: int) -> tuple[bool, str | None, BalanceInfo | None]:
 	"""预检账号状态：验证 session 有效性，无需 WAF cookies。
-	返回 (session_valid, error_msg)"""
+	返回 (session_valid, error_msg, balance)，balance 可直接作为签到前余额复用"""
 	account_name = f'账号 {account_index + 1}'
 	api_user = account_info.get('api_user', '')
 	if not api_user:
-		return False, '缺少 api_user'
+		return False, '缺少 api_user', None
 
 	user_cookies = parse_cookies(account_info.get('cookies', {}))
 	if not user_cookies:
-		return False, 'cookies 格式无效'
+		return False, 'cookies 格式无效', None
 
 	headers = build_headers(api_user)
 	try:
-		async with httpx.AsyncClient(http2=True, timeout=DEFAULT_TIMEOUT, cookies=user_cookies) as client:
-			response = await client.get(f'{ANYROUTER_BASE_URL}/api/user/self', headers=headers, timeout=DEFAULT_TIMEOUT)
+		async with create_client(user_cookies) as client:
+			response = await client.get(f'{ANYROUTER_BASE_URL}/api/user/self', headers=headers)
 			if response.status_code == 401:
 				print(f'[预检] {account_name}: session 已过期 (HTTP 401)，请更新 cookies')
-				return False, 'session 已过期 (HTTP 401)，请更新 cookies'
+				return False, 'session 已过期 (HTTP 401)，请更新 cookies', None
 			if response.status_code == 200:
-				data = response.json()
+				data = orjson.loads(response.content)
 				if data.get('success'):
+					balance_info, _ = parse_balance(data.get('data', {}))
 					print(f'[预检] {account_name}: session 有效')
-					return True, None
-				return False, data.get('message', '未知错误')
-			return False, f'HTTP {response.status_code}'
+					return True, None, balance_info
+				return False, data.get('message', '未知错误'), None
+			return False, f'HTTP {response.status_code}', None
 	except Exception as e:
 		print(f'[预检] {account_name}: 预检请求失败 - {str(e)[:50]}')
 		# 预检失败不阻断，仍尝试后续流程
-		return True, None
+		return True, None, None
 
 
 
-async def get_single_waf_cookies(browser: Browser, account_name: str) -> dict[str, str] | None:
-	"""使用已有浏览器实例获取单个账号的 WAF cookies"""
+async def get_single_waf_cookies(browser: Browser, account_name: str) -> tuple[dict[str, str], float | None] | None:
+	"""使用已有浏览器实例获取单个账号的 WAF cookies，返回 (cookies, 最早过期时间戳)"""
 	context = await browser.new_context(
 		user_agent=DEFAULT_USER_AGENT,
-		viewport={'width': 1920, 'height': 1080},
+		viewport={'width': 800, 'height': 600},  # WAF 不校验窗口尺寸，小视口可减少渲染内存
 	)
 
 	page = await context.new_page()
@@ -446,34 +548,34 @@ async def get_single_waf_cookies(browser: Browser, account_name: str) -> dict[st
 		print(f'[处理中] {account_name}: 访问登录页获取 WAF cookies...')
 		start_time = time.monotonic()
 
-		await page.goto(f'{ANYROUTER_BASE_URL}/login', wait_until='networkidle', timeout=DEFAULT_TIMEOUT * 1000)
-
-		try:
-			await page.wait_for_function('document.readyState === "complete"', timeout=5000)
-		except Exception:
-			await page.wait_for_timeout(3000)
-
-		cookies = await page.context.cookies()
+		login_url = f'{ANYROUTER_BASE_URL}/login'
+		await page.goto(login_url, wait_until='domcontentloaded', timeout=WAF_PAGE_TIMEOUT_MS)
 
-		waf_cookies = {}
-		for cookie in cookies:
-			cookie_name = cookie.get('name')
-			cookie_value = cookie.get('value')
-			if cookie_name in WAF_COOKIE_NAMES and cookie_value is not None:
-				waf_cookies[cookie_name] = cookie_value
+		# WAF cookies 在首个响应及挑战脚本执行后即写入，轮询 cookies 而非等待网络空闲
+		found_cookies: dict[str, Cookie] = {}
+		for _ in range(WAF_POLL_ATTEMPTS):
+			cookies = await page.context.cookies([login_url])
+			# 单次遍历保留 WAF cookies，缺失项由集合差集得出
+			found_cookies = {c['name']: c for c in cookies if c['name'] in WAF_COOKIE_SET}
+			if WAF_COOKIE_SET <= found_cookies.keys():
+				break
+			await asyncio.sleep(WAF_POLL_INTERVAL)
 
-		print(f'[信息] {account_name}: 获取到 {len(waf_cookies)} 个 WAF cookies')
+		print(f'[信息] {account_name}: 获取到 {len(found_cookies)} 个 WAF cookies')
 
-		missing_cookies = [c for c in WAF_COOKIE_NAMES if c not in waf_cookies]
+		missing_cookies = WAF_COOKIE_SET - found_cookies.keys()
 
 		if missing_cookies:
-			print(f'[失败] {account_name}: 缺少 WAF cookies: {missing_cookies}')
+			print(f'[失败] {account_name}: 缺少 WAF cookies: {sorted(missing_cookies)}')
 			return None
 
 		print(f'[成功] {account_name}: 成功获取所有 WAF cookies')
 		elapsed = time.monotonic() - start_time
 		print(f'[耗时] {account_name}: WAF cookies 获取耗时 {elapsed:.1f}s')
-		return waf_cookies
+		waf_cookies = {name: cookie['value'] for name, cookie in found_cookies.items()}
+		# 会话 cookie 的 expires 为 -1，不参与过期时间计算
+		expires = min((c['expires'] for c in found_cookies.values() if c['expires'] > 0), default=None)
+		return waf_cookies, expires
 
 	except Exception as e:
 		print(f'[失败] {account_name}: 获取 WAF cookies 出错: {str(e)[:100]}')
@@ -491,44 +593,34 @@ async def get_all_waf_cookies(account_count: int) -> list[dict[str, str] | None]
 	if cached_cookies:
 		# 缓存命中，所有账号共用同一份 WAF cookies
 		print('[系统] 使用缓存的 WAF cookies，无需启动浏览器')
-		for _ in range(account_count):
-			waf_cookies_list.append(cached_cookies.copy())
-		return waf_cookies_list
+		return [{**cached_cookies} for _ in range(account_count)]
 
 	# 步骤2: 缓存未命中，启动浏览器获取
 	print(f'[系统] 启动浏览器为 {account_count} 个账号获取 WAF cookies...')
 	waf_start_time = time.monotonic()
 
 	async with async_playwright() as p:
-		browser = await p.chromium.launch(
-			headless=True,
-			args=[
-				'--disable-blink-features=AutomationControlled',
-				'--disable-dev-shm-usage',
-				'--disable-features=VizDisplayCompositor',
-				'--no-sandbox',
-			],
-		)
+		browser = await p.chromium.launch(headless=True, args=BROWSER_LAUNCH_ARGS)
 
 		try:
 			# 只需要获取一次 WAF cookies，所有账号共用
 			account_name = '账号 1'
-			waf_cookies = None
+			waf_result = None
 			for attempt in range(MAX_RETRIES):
-				waf_cookies = await get_single_waf_cookies(browser, account_name)
-				if waf_cookies:
+				waf_result = await get_single_waf_cookies(browser, account_name)
+				if waf_result:
 					break
 				if attempt < MAX_RETRIES - 1:
-					delay = RETRY_BASE_DELAY * (2 ** attempt)
-					print(f'[重试] {account_name}: {delay}秒后重试获取 WAF cookies...')
+					delay = get_backoff_delay(attempt)
+					print(f'[重试] {account_name}: {delay:.1f}秒后重试获取 WAF cookies...')
 					await asyncio.sleep(delay)
 
-			if waf_cookies:
+			if waf_result:
+				waf_cookies, expires = waf_result
 				# 保存到缓存
-				save_waf_cache(waf_cookies)
+				save_waf_cache(waf_cookies, expires)
 				# 所有账号共用同一份 WAF cookies
-				for _ in range(account_count):
-					waf_cookies_list.append(waf_cookies.copy())
+				waf_cookies_list = [{**waf_cookies} for _ in range(account_count)]
 			else:
 				# 获取失败，返回 None 列表
 				waf_cookies_list = [None] * account_count
@@ -543,63 +635,77 @@ async def get_all_waf_cookies(account_count: int) -> list[dict[str, str] | None]
 	return waf_cookies_list
 
 
+def parse_balance(user_data: dict) -> tuple[BalanceInfo, str]:
+	"""将 /api/user/self 返回的用户数据换算为 (余额信息, 格式化字符串)"""
+	quota = round(user_data.get('quota', 0) / QUOTA_PER_UNIT, 2)
+	used_quota = round(user_data.get('used_quota', 0) / QUOTA_PER_UNIT, 2)
+	return BalanceInfo(quota=quota, used_quota=used_quota), format_balance(quota, used_quota)
+
+
+def format_balance(quota: float, used_quota: float) -> str:
+	"""格式化余额信息"""
+	return f'余额: ${quota}, 已用: ${used_quota}'
+
+
 async def get_user_info(client: httpx.AsyncClient, headers: dict[str, str], account_name: str) -> tuple[BalanceInfo | None, str | None]:
 	"""异步获取用户信息，返回 (余额信息, 格式化字符串)"""
 	try:
-		response = await client.get(f'{ANYROUTER_BASE_URL}/api/user/self', headers=headers, timeout=DEFAULT_TIMEOUT)
+		response = await client.get(f'{ANYROUTER_BASE_URL}/api/user/self', headers=headers)
 
 		if response.status_code == 200:
-			data = response.json()
+			data = orjson.loads(response.content)
 			if data.get('success'):
-				user_data = data.get('data', {})
-				quota = round(user_data.get('quota', 0) / QUOTA_PER_UNIT, 2)
-				used_quota = round(user_data.get('used_quota', 0) / QUOTA_PER_UNIT, 2)
-				balance_info = BalanceInfo(quota=quota, used_quota=used_quota)
-				info_str = f'余额: ${quota}, 已用: ${used_quota}'
-				return balance_info, info_str
+				return parse_balance(data.get('data', {}))
 	except Exception as e:
-		print(f'[警告] {account_name}: 获取用户信息失败: {str(e)[:50]}')
+		logger.warning(f'[警告] {account_name}: 获取用户信息失败: {str(e)[:50]}')
 	return None, None
 
 
+@lru_cache(maxsize=64)
+def _header_items(api_user: str, checkin: bool = False) -> tuple[tuple[str, str], ...]:
+	"""按 api_user 缓存合并后的请求头，返回不可变的键值对"""
+	extra_headers = CHECKIN_EXTRA_HEADERS if checkin else {}
+	return tuple({**BASE_HEADERS, **extra_headers, 'new-api-user': api_user}.items())
+
+
 def build_headers(api_user: str) -> dict[str, str]:
 	"""构建请求头"""
-	return {
-		'User-Agent': DEFAULT_USER_AGENT,
-		'Accept': 'application/json, text/plain, */*',
-		'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-		'Accept-Encoding': 'gzip, deflate, br, zstd',
-		'Referer': f'{ANYROUTER_BASE_URL}/console',
-		'Origin': ANYROUTER_BASE_URL,
-		'Connection': 'keep-alive',
-		'Sec-Fetch-Dest': 'empty',
-		'Sec-Fetch-Mode': 'cors',
-		'Sec-Fetch-Site': 'same-origin',
-		'new-api-user': api_user,
-	}
+	return dict(_header_items(api_user))
 
 
-async def do_checkin_request(client: httpx.AsyncClient, headers: dict[str, str], account_name: str) -> tuple[bool, str | None]:
-	"""执行签到请求（带重试）"""
-	checkin_headers = headers.copy()
-	checkin_headers.update({'Content-Type': 'application/json', 'X-Requested-With': 'XMLHttpRequest'})
+def build_checkin_headers(api_user: str) -> dict[str, str]:
+	"""构建签到请求头（附带 Content-Type 与 X-Requested-With）"""
+	return dict(_header_items(api_user, checkin=True))
 
-	async def _request():
-		return await client.post(f'{ANYROUTER_BASE_URL}/api/user/sign_in', headers=checkin_headers, timeout=DEFAULT_TIMEOUT)
+
+async def do_checkin_request(client: httpx.AsyncClient, headers: dict[str, str], account_name: str) -> tuple[bool, str | None]:
+	"""执行签到请求（带重试），headers 应由 build_checkin_headers 构建"""
+	checkin_url = f'{ANYROUTER_BASE_URL}/api/user/sign_in'
 
 	try:
-		response = await retry_async(_request)
-		print(f'[响应] {account_name}: HTTP 状态码 {response.status_code}')
+		# 连接级错误由 transport 重试；签到请求本身再做带抖动的指数退避重试
+		for attempt in range(MAX_RETRIES):
+			try:
+				response = await client.post(checkin_url, headers=headers)
+				break
+			except httpx.HTTPError:
+				if attempt == MAX_RETRIES - 1:
+					raise
+				delay = get_backoff_delay(attempt)
+				logger.info(f'[重试] {account_name}: 第 {attempt + 1} 次失败，{delay:.1f}秒后重试...')
+				await asyncio.sleep(delay)
+
+		logger.info(f'[响应] {account_name}: HTTP 状态码 {response.status_code}')
 
 		if response.status_code == 200:
 			try:
-				result = response.json()
+				result = orjson.loads(response.content)
 				if result.get('ret') == 1 or result.get('code') == 0 or result.get('success'):
 					return True, None
 				else:
 					error_msg = result.get('msg', result.get('message', '未知错误'))
 					return False, error_msg
-			except json.JSONDecodeError:
+			except orjson.JSONDecodeError:
 				if 'success' in response.text.lower():
 					return True, None
 				return False, '响应格式无效'
@@ -611,32 +717,35 @@ async def do_checkin_request(client: httpx.AsyncClient, headers: dict[str, str],
 		return False, str(e)[:100]
 
 
-async def check_in_account(account_info: AccountConfig, account_index: int, waf_cookies: dict[str, str] | None) -> CheckinResult:
-	"""为单个账号执行签到操作（使用预获取的 WAF cookies）"""
+async def check_in_account(
+	account_info: AccountConfig,
+	account_index: int,
+	waf_cookies: dict[str, str] | None,
+	balance_before: BalanceInfo | None = None,
+) -> CheckinResult:
+	"""为单个账号执行签到操作（使用预获取的 WAF cookies）
+
+	balance_before 为预检阶段已取得的余额时，直接作为签到前余额，省去一次请求"""
 	account_name = f'账号 {account_index + 1}'
-	print(f'\n[处理中] 开始处理 {account_name}')
+	logger.info(f'\n[处理中] 开始处理 {account_name}')
 
-	# 解析账号配置
-	cookies_data = account_info.get('cookies', {})
+	# 依次校验 api_user、WAF cookies、用户 cookies，任一失败立即返回，避免无用的解析与请求
 	api_user = account_info.get('api_user', '')
-
 	if not api_user:
-		print(f'[失败] {account_name}: 未找到 API user 标识')
+		logger.info(f'[失败] {account_name}: 未找到 API user 标识')
 		return CheckinResult(success=False, account_index=account_index, user_info=None, error='缺少 api_user', balance_before=None, balance_after=None)
 
-	# 日志脱敏
-	print(f'[信息] {account_name}: API user: {mask_sensitive(api_user)}')
+	if not waf_cookies:
+		logger.info(f'[失败] {account_name}: WAF cookies 获取失败')
+		return CheckinResult(success=False, account_index=account_index, user_info=None, error='WAF cookies 获取失败', balance_before=None, balance_after=None)
 
-	# 解析用户 cookies
-	user_cookies = parse_cookies(cookies_data)
+	user_cookies = parse_cookies(account_info.get('cookies', {}))
 	if not user_cookies:
-		print(f'[失败] {account_name}: 配置格式无效')
+		logger.info(f'[失败] {account_name}: 配置格式无效')
 		return CheckinResult(success=False, account_index=account_index, user_info=None, error='cookies 格式无效', balance_before=None, balance_after=None)
 
-	# 检查 WAF cookies
-	if not waf_cookies:
-		print(f'[失败] {account_name}: WAF cookies 获取失败')
-		return CheckinResult(success=False, account_index=account_index, user_info=None, error='WAF cookies 获取失败', balance_before=None, balance_after=None)
+	# 日志脱敏
+	logger.info(f'[信息] {account_name}: API user: {mask_sensitive(api_user)}')
 
 	# 合并 cookies
 	all_cookies = {**user_cookies, **waf_cookies}
@@ -644,20 +753,25 @@ async def check_in_account(account_info: AccountConfig, account_index: int, waf_
 	# 构建请求头
 	headers = build_headers(api_user)
 
-	async with httpx.AsyncClient(http2=True, timeout=DEFAULT_TIMEOUT, cookies=all_cookies) as client:
-		# 获取签到前的余额
-		balance_before, info_before = await get_user_info(client, headers, account_name)
+	# 每个账号独立的客户端与 cookie jar：并发签到时各账号 cookies 互不干扰，
+	# 服务端返回的 Set-Cookie 也只会写入当前账号的 jar
+	async with create_client(all_cookies) as client:
+		# 获取签到前的余额（预检已取得时直接复用）
+		if balance_before:
+			info_before = format_balance(balance_before['quota'], balance_before['used_quota'])
+		else:
+			balance_before, info_before = await get_user_info(client, headers, account_name)
 		if info_before:
-			print(f'[信息] {account_name}: 签到前 - {info_before}')
+			logger.info(f'[信息] {account_name}: 签到前 - {info_before}')
 
 		# 执行签到请求
-		print(f'[网络] {account_name}: 执行签到请求')
-		api_success, api_error = await do_checkin_request(client, headers, account_name)
+		logger.info(f'[网络] {account_name}: 执行签到请求')
+		api_success, api_error = await do_checkin_request(client, build_checkin_headers(api_user), account_name)
 
 		# 获取签到后的余额
 		balance_after, info_after = await get_user_info(client, headers, account_name)
 		if info_after:
-			print(f'[信息] {account_name}: 签到后 - {info_after}')
+			logger.info(f'[信息] {account_name}: 签到后 - {info_after}')
 
 	# 计算实际签到奖励，判断签到是否真正成功
 	user_info = info_after or info_before
@@ -669,28 +783,28 @@ async def check_in_account(account_info: AccountConfig, account_index: int, waf_
 		# 签到成功（即使同时有使用消耗）
 		actual_success = True
 		change_str = f'+${actual_reward}'
-		print(f'[成功] {account_name}: 签到成功！余额变化: {change_str}')
+		logger.info(f'[成功] {account_name}: 签到成功！余额变化: {change_str}')
 		user_info = f"{info_after} (变化: {change_str})"
 	elif actual_reward is not None and actual_reward <= 0 and api_success:
 		# API 返回成功但实际奖励为0，说明今天已经签到过了
 		actual_success = False
 		error_msg = '今日已签到'
-		print(f'[跳过] {account_name}: 今日已签到，余额无变化')
+		logger.info(f'[跳过] {account_name}: 今日已签到，余额无变化')
 		user_info = f"{info_after} (今日已签到)"
 	elif actual_reward is not None and actual_reward <= 0:
 		# 余额有数据但无变化且 API 失败
 		actual_success = False
 		error_msg = api_error
-		print(f'[失败] {account_name}: 签到失败 - {api_error}')
+		logger.info(f'[失败] {account_name}: 签到失败 - {api_error}')
 	elif api_success:
 		# 无法获取余额信息，但 API 返回成功
 		actual_success = True
-		print(f'[成功] {account_name}: API 返回签到成功（无法验证余额）')
+		logger.info(f'[成功] {account_name}: API 返回签到成功（无法验证余额）')
 	else:
 		# API 返回失败
 		actual_success = False
 		error_msg = api_error
-		print(f'[失败] {account_name}: 签到失败 - {api_error}')
+		logger.info(f'[失败] {account_name}: 签到失败 - {api_error}')
 
 	return CheckinResult(
 		success=actual_success,
@@ -706,7 +820,8 @@ async def main():
 	"""主函数"""
 	load_dotenv()
 	print('[系统] AnyRouter.top 多账号自动签到脚本启动（优化版）')
-	print(f'[时间] 执行时间: {get_beijing_time()} (北京时间)')
+	start_time = get_beijing_time()
+	print(f'[时间] 执行时间: {start_time} (北京时间)')
 
 	# 加载账号配置
 	accounts = load_accounts()
@@ -717,10 +832,12 @@ async def main():
 	total_count = len(accounts)
 	print(f'[信息] 发现 {total_count} 个账号配置')
 
-	# 步骤1：预检所有账号 session 有效性（无需 WAF cookies）
+	# 步骤1：预检所有账号 session 有效性（无需 WAF cookies），同时在后台获取 WAF cookies
+	waf_task = asyncio.create_task(get_all_waf_cookies(total_count))
 	print('[系统] 预检账号 session 有效性...')
-	precheck_tasks = [precheck_account(account, i) for i, account in enumerate(accounts)]
-	precheck_results = await asyncio.gather(*precheck_tasks, return_exceptions=True)
+	async with asyncio.TaskGroup() as tg:
+		precheck_tasks = [tg.create_task(capture_exception(precheck_account(account, i))) for i, account in enumerate(accounts)]
+	precheck_results = [task.result() for task in precheck_tasks]
 
 	# 分离预检失败和通过的账号
 	failed_indices: list[int] = []
@@ -736,6 +853,9 @@ async def main():
 
 	if not valid_indices:
 		print('[失败] 所有账号预检不通过（session 过期或配置错误），程序退出')
+		# 后台 WAF 任务可能已失败（如浏览器无法启动），回收时吞掉其异常，确保仍会发送通知
+		waf_task.cancel()
+		await asyncio.gather(waf_task, return_exceptions=True)
 		results: list[CheckinResult | BaseException] = []
 		for i in range(total_count):
 			pr = precheck_results[i]
@@ -746,22 +866,24 @@ async def main():
 					success=False, account_index=i, user_info=None,
 					error=pr[1], balance_before=None, balance_after=None,
 				))
-		notify_content = build_plain_text_notification(results, 0, 0, total_count)
+		notify_content = build_plain_text_notification(results, 0, 0, total_count, run_time=start_time)
 		print(notify_content)
-		html_content = build_html_notification(results, 0, 0, total_count)
+		html_content = build_html_notification(results, 0, 0, total_count, run_time=start_time)
 		notify.push_message('AnyRouter 签到结果', html_content, msg_type='html', text_content=notify_content)
 		sys.exit(1)
 
-	# 步骤2：仅为有效账号获取 WAF cookies
-	valid_accounts = [accounts[i] for i in valid_indices]
-	waf_cookies_list = await get_all_waf_cookies(len(valid_accounts))
+	# 步骤2：等待 WAF cookies 获取完成
+	waf_cookies_list = await waf_task
 
 	# 步骤3：并发执行有效账号的签到
-	signin_tasks = [
-		check_in_account(valid_accounts[vi], valid_indices[vi], waf_cookies_list[vi])
-		for vi in range(len(valid_indices))
-	]
-	signin_results = await asyncio.gather(*signin_tasks, return_exceptions=True)
+	async with asyncio.TaskGroup() as tg:
+		signin_tasks = [
+			tg.create_task(
+				capture_exception(check_in_account(accounts[i], i, waf_cookies_list[i], balance_before=precheck_results[i][2]))
+			)
+			for i in valid_indices
+		]
+	signin_results = [task.result() for task in signin_tasks]
 
 	# 合并结果：预检失败的 + 签到结果的
 	results: list[CheckinResult | BaseException] = []
@@ -793,11 +915,11 @@ async def main():
 				skipped_count += 1
 
 	# 构建纯文本通知内容（用于控制台输出）
-	notify_content = build_plain_text_notification(results, success_count, skipped_count, total_count)
+	notify_content = build_plain_text_notification(results, success_count, skipped_count, total_count, run_time=start_time)
 	print(notify_content)
 
 	# 构建 HTML 通知内容（用于邮件）
-	html_content = build_html_notification(results, success_count, skipped_count, total_count)
+	html_content = build_html_notification(results, success_count, skipped_count, total_count, run_time=start_time)
 
 	# 只有签到成功或失败才发送通知，全部已签到则不发送
 	fail_count = total_count - success_count - skipped_count
@@ -812,6 +934,7 @@ async def main():
 
 def run_main():
 	"""运行主函数的包装函数"""
+	log_listener = setup_logging()
 	try:
 		asyncio.run(main())
 	except KeyboardInterrupt:
@@ -820,6 +943,9 @@ def run_main():
 	except Exception as e:
 		print(f'\n[失败] 程序执行出错: {e}')
 		sys.exit(1)
+	finally:
+		notify.close()
+		log_listener.stop()
 
 
 if __name__ == '__main__':
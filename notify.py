@@ -1,6 +1,7 @@
 import os
 import re
 import smtplib
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from html import unescape
@@ -10,6 +11,7 @@ import httpx
 
 # 通知超时配置
 NOTIFY_TIMEOUT = 30.0
+NOTIFY_LIMITS = httpx.Limits(max_keepalive_connections=10, max_connections=20)
 
 
 class NotificationKit:
@@ -24,6 +26,18 @@ class NotificationKit:
 		self.dingding_webhook: str | None = os.getenv('DINGDING_WEBHOOK')
 		self.feishu_webhook: str | None = os.getenv('FEISHU_WEBHOOK')
 		self.weixin_webhook: str | None = os.getenv('WEIXIN_WEBHOOK')
+		# 所有 Webhook 渠道共用一个长连接客户端，复用 TCP/TLS 连接
+		self._client = httpx.Client(timeout=NOTIFY_TIMEOUT, limits=NOTIFY_LIMITS)
+
+	def close(self) -> None:
+		"""关闭底层 HTTP 客户端"""
+		self._client.close()
+
+	def __enter__(self) -> 'NotificationKit':
+		return self
+
+	def __exit__(self, *exc_info: object) -> None:
+		self.close()
 
 	@staticmethod
 	def _html_to_text(content: str) -> str:
@@ -82,9 +96,8 @@ class NotificationKit:
 			raise ValueError('未配置息知 Key')
 
 		data = {'title': title, 'content': content}
-		with httpx.Client(timeout=NOTIFY_TIMEOUT) as client:
-			response = client.post(f'https://xizhi.qqoq.net/{self.xizhi_key}.send', json=data)
-			response.raise_for_status()
+		response = self._client.post(f'https://xizhi.qqoq.net/{self.xizhi_key}.send', json=data)
+		response.raise_for_status()
 		return 'text'
 
 	def send_serverPush(self, title: str, content: str) -> str:
@@ -93,9 +106,8 @@ class NotificationKit:
 			raise ValueError('未配置 Server酱 Key')
 
 		data = {'title': title, 'desp': content}
-		with httpx.Client(timeout=NOTIFY_TIMEOUT) as client:
-			response = client.post(f'https://sctapi.ftqq.com/{self.server_push_key}.send', json=data)
-			response.raise_for_status()
+		response = self._client.post(f'https://sctapi.ftqq.com/{self.server_push_key}.send', json=data)
+		response.raise_for_status()
 		return 'markdown'
 
 	def send_dingtalk(self, title: str, content: str, msg_format: Literal['text', 'markdown'] = 'text') -> str:
@@ -111,9 +123,8 @@ class NotificationKit:
 		else:
 			data = {'msgtype': 'text', 'text': {'content': f'{title}\n{content}'}}
 
-		with httpx.Client(timeout=NOTIFY_TIMEOUT) as client:
-			response = client.post(self.dingding_webhook, json=data)
-			response.raise_for_status()
+		response = self._client.post(self.dingding_webhook, json=data)
+		response.raise_for_status()
 		return msg_format
 
 	def send_feishu(self, title: str, content: str, msg_format: Literal['text', 'markdown'] = 'markdown') -> str:
@@ -132,9 +143,8 @@ class NotificationKit:
 		else:
 			data = {'msg_type': 'text', 'content': {'text': f'{title}\n{content}'}}
 
-		with httpx.Client(timeout=NOTIFY_TIMEOUT) as client:
-			response = client.post(self.feishu_webhook, json=data)
-			response.raise_for_status()
+		response = self._client.post(self.feishu_webhook, json=data)
+		response.raise_for_status()
 		return msg_format
 
 	def send_wecom(self, title: str, content: str, msg_format: Literal['text', 'markdown'] = 'text') -> str:
@@ -147,9 +157,8 @@ class NotificationKit:
 		else:
 			data = {'msgtype': 'text', 'text': {'content': f'{title}\n{content}'}}
 
-		with httpx.Client(timeout=NOTIFY_TIMEOUT) as client:
-			response = client.post(self.weixin_webhook, json=data)
-			response.raise_for_status()
+		response = self._client.post(self.weixin_webhook, json=data)
+		response.raise_for_status()
 		return msg_format
 
 	def push_message(
@@ -166,30 +175,45 @@ class NotificationKit:
 		)
 		markdown_content = plain_text_content
 
-		notifications: list[tuple[str, Callable[[], str]]] = [
-			('Email', lambda: self.send_email(title, html_content if msg_type == 'html' else plain_text_content, msg_type)),
-			('Xizhi', lambda: self.send_xizhi(title, plain_text_content)),
-			('Server Push', lambda: self.send_serverPush(title, markdown_content)),
-			('DingTalk', lambda: self.send_dingtalk(title, plain_text_content, 'text')),
-			('Feishu', lambda: self.send_feishu(title, markdown_content, 'markdown')),
-			('WeChat Work', lambda: self.send_wecom(title, plain_text_content, 'text')),
+		# 配置已在 __init__ 中缓存，直接按属性判断渠道是否启用
+		notifications: list[tuple[str, bool, Callable[[], str]]] = [
+			(
+				'Email',
+				bool(self.email_user and self.email_pass and self.email_to),
+				lambda: self.send_email(title, html_content if msg_type == 'html' else plain_text_content, msg_type),
+			),
+			('Xizhi', bool(self.xizhi_key), lambda: self.send_xizhi(title, plain_text_content)),
+			('Server Push', bool(self.server_push_key), lambda: self.send_serverPush(title, markdown_content)),
+			('DingTalk', bool(self.dingding_webhook), lambda: self.send_dingtalk(title, plain_text_content, 'text')),
+			('Feishu', bool(self.feishu_webhook), lambda: self.send_feishu(title, markdown_content, 'markdown')),
+			('WeChat Work', bool(self.weixin_webhook), lambda: self.send_wecom(title, plain_text_content, 'text')),
 		]
 
+		enabled: list[tuple[str, Callable[[], str]]] = []
+		for name, configured, func in notifications:
+			if configured:
+				enabled.append((name, func))
+			else:
+				print(f'[{name}]: 跳过 - 未配置')
+
+		# 各渠道相互独立，并行发送，总耗时取决于最慢的渠道；结果按渠道顺序输出
 		success_count = 0
-		for name, func in notifications:
-			try:
-				used_format = func()
-				print(f'[{name}]: 消息推送成功 (格式: {used_format})')
-				success_count += 1
-			except ValueError as e:
-				# 配置缺失，静默跳过
-				print(f'[{name}]: 跳过 - {e}')
-			except httpx.HTTPStatusError as e:
-				print(f'[{name}]: HTTP 错误 - {e.response.status_code}')
-			except httpx.TimeoutException:
-				print(f'[{name}]: 请求超时')
-			except Exception as e:
-				print(f'[{name}]: 失败 - {str(e)[:50]}')
+		with ThreadPoolExecutor(max_workers=max(len(enabled), 1)) as executor:
+			futures = [(name, executor.submit(func)) for name, func in enabled]
+			for name, future in futures:
+				try:
+					used_format = future.result()
+					print(f'[{name}]: 消息推送成功 (格式: {used_format})')
+					success_count += 1
+				except ValueError as e:
+					# 配置缺失，静默跳过
+					print(f'[{name}]: 跳过 - {e}')
+				except httpx.HTTPStatusError as e:
+					print(f'[{name}]: HTTP 错误 - {e.response.status_code}')
+				except httpx.TimeoutException:
+					print(f'[{name}]: 请求超时')
+				except Exception as e:
+					print(f'[{name}]: 失败 - {str(e)[:50]}')
 
 		print(f'[通知] 共 {success_count} 个通知发送成功')
 
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# 添加项目根目录到 PATH（每个测试会话只执行一次）
+project_root = Path(__file__).parent.parent
+if str(project_root) not in sys.path:
+	sys.path.insert(0, str(project_root))
@@ -1,12 +1,11 @@
 import asyncio
-import sys
+import time
 from collections import defaultdict
-from pathlib import Path
 from typing import Any
 from unittest.mock import patch
 
-project_root = Path(__file__).parent.parent
-sys.path.insert(0, str(project_root))
+import httpx
+import pytest
 
 import checkin
 
@@ -47,6 +46,7 @@ def test_check_in_account_isolates_cookies_and_prefers_runtime_waf():
 
 	async def fake_do_checkin_request(client, headers, account_name):
 		await asyncio.sleep(0)
+		assert headers['Content-Type'] == 'application/json'
 		seen_cookies.append(
 			(f'{account_name}-sign-in', headers['new-api-user'], client.cookies['session'], client.cookies['acw_tc'])
 		)
@@ -79,8 +79,8 @@ def test_check_in_account_isolates_cookies_and_prefers_runtime_waf():
 	assert len(FakeAsyncClient.instances) == 2
 	assert [client.cookies['session'] for client in FakeAsyncClient.instances] == ['session-1', 'session-2']
 	assert all(client.cookies['acw_tc'] == 'fresh-waf' for client in FakeAsyncClient.instances)
-	assert all(client.kwargs['http2'] is True for client in FakeAsyncClient.instances)
-	assert all(client.kwargs['timeout'] == checkin.DEFAULT_TIMEOUT for client in FakeAsyncClient.instances)
+	assert all(isinstance(client.kwargs['transport'], httpx.AsyncHTTPTransport) for client in FakeAsyncClient.instances)
+	assert all(client.kwargs['timeout'] is checkin.HTTP_TIMEOUT for client in FakeAsyncClient.instances)
 	assert all(result['success'] for result in results)
 	assert ('账号 1', 'user-1', 'session-1', 'fresh-waf') in seen_cookies
 	assert ('账号 2', 'user-2', 'session-2', 'fresh-waf') in seen_cookies
@@ -98,11 +98,15 @@ def test_main_keeps_other_results_when_one_account_raises():
 			{'acw_tc': 'waf-2', 'cdn_sec_tc': 'cdn-2', 'acw_sc__v2': 'v2-2'},
 		]
 
-	async def fake_check_in_account(account_info, account_index, waf_cookies):
+	async def fake_precheck_account(account_info, account_index):
+		return True, None, {'quota': 10.0 + account_index, 'used_quota': 0.0}
+
+	async def fake_check_in_account(account_info, account_index, waf_cookies, balance_before=None):
 		if account_index == 0:
 			raise RuntimeError('boom')
 		assert account_info['api_user'] == 'user-2'
 		assert waf_cookies['acw_tc'] == 'waf-2'
+		assert balance_before == {'quota': 11.0, 'used_quota': 0.0}
 		return {
 			'success': True,
 			'account_index': account_index,
@@ -112,14 +116,16 @@ def test_main_keeps_other_results_when_one_account_raises():
 			'balance_after': {'quota': 11.0, 'used_quota': 0.0},
 		}
 
-	def fake_build_html_notification(results, success_count, skipped_count, total_count):
+	def fake_build_html_notification(results, success_count, skipped_count, total_count, run_time=None):
+		captured['run_time'] = run_time
 		captured['results'] = results
 		captured['success_count'] = success_count
 		captured['skipped_count'] = skipped_count
 		captured['total_count'] = total_count
 		return '<html>ok</html>'
 
-	def fake_build_plain_text_notification(results, success_count, skipped_count, total_count):
+	def fake_build_plain_text_notification(results, success_count, skipped_count, total_count, run_time=None):
+		assert run_time == '2026-03-29 00:00:00'
 		assert success_count == 1
 		assert skipped_count == 0
 		assert total_count == 2
@@ -134,6 +140,7 @@ def test_main_keeps_other_results_when_one_account_raises():
 			],
 		),
 		patch('checkin.get_beijing_time', return_value='2026-03-29 00:00:00'),
+		patch('checkin.precheck_account', fake_precheck_account),
 		patch('checkin.get_all_waf_cookies', fake_get_all_waf_cookies),
 		patch('checkin.check_in_account', fake_check_in_account),
 		patch('checkin.build_html_notification', side_effect=fake_build_html_notification),
@@ -143,6 +150,7 @@ def test_main_keeps_other_results_when_one_account_raises():
 	):
 		run_async(checkin.main())
 
+	assert captured['run_time'] == '2026-03-29 00:00:00'
 	assert captured['success_count'] == 1
 	assert captured['skipped_count'] == 0
 	assert captured['total_count'] == 2
@@ -152,6 +160,43 @@ def test_main_keeps_other_results_when_one_account_raises():
 	mock_exit.assert_called_once_with(0)
 
 
+def test_main_notifies_when_all_prechecks_fail_even_if_waf_task_failed():
+	captured: dict[str, Any] = {}
+
+	async def fake_get_all_waf_cookies(account_count):
+		raise RuntimeError('browser not installed')
+
+	async def fake_precheck_account(account_info, account_index):
+		# 让出控制权，使后台 WAF 任务先行失败
+		for _ in range(3):
+			await asyncio.sleep(0)
+		return False, 'session 已过期 (HTTP 401)，请更新 cookies', None
+
+	def fake_build_html_notification(results, success_count, skipped_count, total_count, run_time=None):
+		captured['results'] = results
+		return '<html>expired</html>'
+
+	with (
+		patch('checkin.load_accounts', return_value=[{'cookies': {'session': 'session-1'}, 'api_user': 'user-1'}]),
+		patch('checkin.get_beijing_time', return_value='2026-03-29 00:00:00'),
+		patch('checkin.precheck_account', fake_precheck_account),
+		patch('checkin.get_all_waf_cookies', fake_get_all_waf_cookies),
+		patch('checkin.build_html_notification', side_effect=fake_build_html_notification),
+		patch('checkin.build_plain_text_notification', return_value='plain-text-expired'),
+		patch.object(checkin.notify, 'push_message') as mock_push_message,
+		patch('checkin.sys.exit', side_effect=SystemExit) as mock_exit,
+		pytest.raises(SystemExit),
+	):
+		run_async(checkin.main())
+
+	assert captured['results'][0]['success'] is False
+	assert captured['results'][0]['error'] == 'session 已过期 (HTTP 401)，请更新 cookies'
+	mock_push_message.assert_called_once_with(
+		'AnyRouter 签到结果', '<html>expired</html>', msg_type='html', text_content='plain-text-expired'
+	)
+	mock_exit.assert_called_once_with(1)
+
+
 def test_build_plain_text_notification_highlights_status_stats_and_details():
 	with patch('checkin.get_beijing_time', return_value='2026-03-30 09:54:49'):
 		text = checkin.build_plain_text_notification(
@@ -186,3 +231,85 @@ def test_build_plain_text_notification_highlights_status_stats_and_details():
 			'   余额：$2992.75｜已用：$207.25',
 		]
 	)
+
+
+def test_parse_cookies_splits_string_and_keeps_values_with_equals():
+	cookies = checkin.parse_cookies('session=abc==; acw_tc=xyz ;invalid; empty=')
+
+	assert cookies == {'session': 'abc==', 'acw_tc': 'xyz', 'empty': ''}
+	assert checkin.parse_cookies({'session': 'abc'}) == {'session': 'abc'}
+
+
+def test_load_accounts_rejects_account_missing_required_fields(monkeypatch):
+	monkeypatch.setenv('ANYROUTER_ACCOUNTS', '[{"cookies": "session=1", "api_user": "1"}, {"cookies": "session=2"}]')
+	assert checkin.load_accounts() is None
+
+	monkeypatch.setenv('ANYROUTER_ACCOUNTS', '[{"cookies": "session=1", "api_user": "1"}]')
+	assert checkin.load_accounts() == [{'cookies': 'session=1', 'api_user': '1'}]
+
+
+def test_load_waf_cache_expires_with_earliest_cookie_expiry(tmp_path, monkeypatch):
+	cache_file = tmp_path / '.waf_cache.json'
+	monkeypatch.setattr(checkin, 'WAF_CACHE_FILE', cache_file)
+	cookies = {'acw_tc': 'a', 'cdn_sec_tc': 'b', 'acw_sc__v2': 'c'}
+
+	checkin.save_waf_cache(cookies, expires=time.time() + 600)
+	assert checkin.load_waf_cache() == cookies
+
+	checkin.save_waf_cache(cookies, expires=time.time() - 1)
+	assert checkin.load_waf_cache() is None
+
+
+def test_do_checkin_request_retries_transient_errors_with_backoff():
+	attempts: list[httpx.Request] = []
+	delays: list[float] = []
+
+	def handler(request):
+		attempts.append(request)
+		if len(attempts) == 1:
+			raise httpx.ReadError('connection reset', request=request)
+		return httpx.Response(200, json={'success': True})
+
+	async def fake_sleep(delay):
+		delays.append(delay)
+
+	async def run():
+		async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+			return await checkin.do_checkin_request(
+				client, {**checkin.build_checkin_headers('user-1'), 'X-Trace-Id': 'trace-1'}, '账号 1'
+			)
+
+	with patch('checkin.asyncio.sleep', fake_sleep):
+		assert run_async(run()) == (True, None)
+
+	assert len(attempts) == 2
+	assert attempts[-1].headers['new-api-user'] == 'user-1'
+	assert attempts[-1].headers['Content-Type'] == 'application/json'
+	assert attempts[-1].headers['X-Trace-Id'] == 'trace-1'
+	assert len(delays) == 1
+	assert checkin.RETRY_BASE_DELAY * 0.5 <= delays[0] <= checkin.RETRY_BASE_DELAY * 1.5
+
+
+def test_get_backoff_delay_is_capped_and_jittered():
+	with patch('checkin.random.uniform', side_effect=lambda low, high: high):
+		assert checkin.get_backoff_delay(0) == checkin.RETRY_BASE_DELAY * 1.5
+		assert checkin.get_backoff_delay(10) == checkin.MAX_BACKOFF * 1.5
+
+
+def test_mask_sensitive_keeps_edges_and_masks_middle():
+	assert checkin.mask_sensitive('') == '***'
+	assert checkin.mask_sensitive('12345') == '*****'
+	assert checkin.mask_sensitive('1234567890') == '1234**7890'
+
+
+def test_check_in_account_fails_fast_without_waf_cookies():
+	with (
+		patch('checkin.parse_cookies') as mock_parse_cookies,
+		patch('checkin.create_client') as mock_create_client,
+	):
+		result = run_async(checkin.check_in_account({'cookies': 'session=1', 'api_user': 'user-1'}, 0, None))
+
+	assert result['success'] is False
+	assert result['error'] == 'WAF cookies 获取失败'
+	mock_parse_cookies.assert_not_called()
+	mock_create_client.assert_not_called()
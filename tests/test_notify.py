@@ -1,167 +1,199 @@
+import json
 import os
-import sys
-from datetime import datetime
+import re
 from pathlib import Path
-from unittest.mock import MagicMock, patch
+from unittest.mock import patch
 
+import httpx
 import pytest
-from dotenv import load_dotenv
-
-# 添加项目根目录到 PATH
-project_root = Path(__file__).parent.parent
-sys.path.insert(0, str(project_root))
 
 from notify import NotificationKit
 
 # 注意：不在模块级别加载 .env，避免影响测试
 
 
-@pytest.fixture(autouse=True)
-def clear_env():
-	"""每个测试前清除环境变量"""
-	# 保存原始环境变量
-	original_env = os.environ.copy()
-	os.environ.clear()
-	yield
-	# 恢复环境变量
-	os.environ.clear()
-	os.environ.update(original_env)
-
-
-def test_real_notification():
-	"""真实接口测试，需要配置.env.local文件"""
-	if os.getenv('ENABLE_REAL_TEST') != 'true':
-		pytest.skip('未启用真实接口测试')
-
-	# 仅在真实测试时加载 .env
-	load_dotenv(project_root / '.env')
-	notification_kit = NotificationKit()
-
-	notification_kit.push_message(
-		'测试消息', f'这是一条测试消息\n发送时间: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}'
-	)
-
-
-@patch('notify.smtplib.SMTP_SSL')
-def test_send_email(mock_smtp_ssl):
-	# 设置必要的环境变量
-	os.environ['EMAIL_USER'] = 'test@example.com'
-	os.environ['EMAIL_PASS'] = 'password'
-	os.environ['EMAIL_TO'] = 'recipient@example.com'
-
-	notification_kit = NotificationKit()
-	mock_server = MagicMock()
-	mock_smtp_ssl.return_value = mock_server
+EMAIL_CONFIG = {'email_user': 'test@example.com', 'email_pass': 'password', 'email_to': 'recipient@example.com'}
+ALL_CHANNELS_CONFIG = {
+	**EMAIL_CONFIG,
+	'dingding_webhook': 'https://test.com',
+	'weixin_webhook': 'https://test.com',
+	'xizhi_key': 'key',
+	'feishu_webhook': 'https://test.com',
+	'server_push_key': 'key',
+}
 
-	notification_kit.send_email('测试标题', '测试内容')
 
-	assert mock_server.login.called
-	assert mock_server.send_message.called
+@pytest.fixture(scope='session')
+def shared_kit() -> NotificationKit:
+	"""整个测试会话共用一个未配置任何渠道的 NotificationKit，避免每个测试重复执行 __init__"""
+	with patch.dict(os.environ, {}, clear=True):
+		kit = NotificationKit()
+	kit.close()
+	return kit
 
 
-@patch('httpx.Client')
-def test_send_xizhi(mock_client_class):
-	os.environ['XIZHI_KEY'] = 'test_key'
+@pytest.fixture
+def sent_requests() -> list[httpx.Request]:
+	"""记录经 MockTransport 发出的全部请求"""
+	return []
 
-	notification_kit = NotificationKit()
-	title = 'test-title'
-	content = 'test-content'
-	mock_response = MagicMock()
-	mock_response.raise_for_status = MagicMock()
-	mock_client = MagicMock()
-	mock_client.post.return_value = mock_response
-	mock_client_class.return_value.__enter__.return_value = mock_client
-
-	notification_kit.send_xizhi(title, content)
-
-	mock_client.post.assert_called_once()
-	args, kwargs = mock_client.post.call_args
-	assert args[0] == 'https://xizhi.qqoq.net/test_key.send'
-	assert kwargs['json'] == {
-		'title': title,
-		'content': content,
-	}
 
+@pytest.fixture
+def make_kit(shared_kit, sent_requests, monkeypatch):
+	"""通过 monkeypatch 为共享的 NotificationKit 设置渠道配置（测试结束自动还原），
+	并将内部客户端替换为基于 MockTransport 的真实 httpx.Client"""
 
-@patch('httpx.Client')
-def test_send_serverPush(mock_client_class):
-	os.environ['SERVERPUSHKEY'] = 'test_key'
-
-	notification_kit = NotificationKit()
-	mock_response = MagicMock()
-	mock_response.raise_for_status = MagicMock()
-	mock_client = MagicMock()
-	mock_client.post.return_value = mock_response
-	mock_client_class.return_value.__enter__.return_value = mock_client
+	def handler(request: httpx.Request) -> httpx.Response:
+		sent_requests.append(request)
+		return httpx.Response(200, json={'ok': True})
 
-	notification_kit.send_serverPush('测试标题', '测试内容')
+	client = httpx.Client(transport=httpx.MockTransport(handler))
+	monkeypatch.setattr(shared_kit, '_client', client)
 
-	mock_client.post.assert_called_once()
+	def _make(**config: str) -> NotificationKit:
+		for name, value in config.items():
+			monkeypatch.setattr(shared_kit, name, value)
+		return shared_kit
 
+	yield _make
+	client.close()
 
-@patch('httpx.Client')
-def test_send_dingtalk(mock_client_class):
-	os.environ['DINGDING_WEBHOOK'] = 'https://oapi.dingtalk.com/robot/test'
 
-	notification_kit = NotificationKit()
-	mock_response = MagicMock()
-	mock_response.raise_for_status = MagicMock()
-	mock_client = MagicMock()
-	mock_client.post.return_value = mock_response
-	mock_client_class.return_value.__enter__.return_value = mock_client
-
-	notification_kit.send_dingtalk('测试标题', '测试内容')
-
-	mock_client.post.assert_called_once()
-	args = mock_client.post.call_args[1]
-	assert args['json']['msgtype'] == 'text'
+def test_real_notification():
+	"""真实接口测试，需要配置.env.local文件"""
+	if os.getenv('ENABLE_REAL_TEST') != 'true':
+		pytest.skip('未启用真实接口测试')
 
+	from datetime import datetime
 
-@patch('httpx.Client')
-def test_send_feishu(mock_client_class):
-	os.environ['FEISHU_WEBHOOK'] = 'https://open.feishu.cn/open-apis/bot/v2/test'
+	from dotenv import load_dotenv
 
+	# 仅在真实测试时加载 .env
+	load_dotenv(Path(__file__).parent.parent / '.env')
 	notification_kit = NotificationKit()
-	mock_response = MagicMock()
-	mock_response.raise_for_status = MagicMock()
-	mock_client = MagicMock()
-	mock_client.post.return_value = mock_response
-	mock_client_class.return_value.__enter__.return_value = mock_client
-
-	notification_kit.send_feishu('测试标题', '测试内容')
-
-	mock_client.post.assert_called_once()
-	args = mock_client.post.call_args[1]
-	assert 'card' in args['json']
 
+	notification_kit.push_message(
+		'测试消息', f'这是一条测试消息\n发送时间: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}'
+	)
 
-@patch('httpx.Client')
-def test_send_wecom(mock_client_class):
-	os.environ['WEIXIN_WEBHOOK'] = 'https://qyapi.weixin.qq.com/test'
 
-	notification_kit = NotificationKit()
-	mock_response = MagicMock()
-	mock_response.raise_for_status = MagicMock()
-	mock_client = MagicMock()
-	mock_client.post.return_value = mock_response
-	mock_client_class.return_value.__enter__.return_value = mock_client
+def test_init_reads_config_from_env():
+	env = {
+		'EMAIL_USER': 'test@example.com',
+		'EMAIL_PASS': 'password',
+		'EMAIL_TO': 'recipient@example.com',
+		'DINGDING_WEBHOOK': 'https://test.com',
+		'WEIXIN_WEBHOOK': 'https://test.com',
+		'XIZHI_KEY': 'key',
+		'FEISHU_WEBHOOK': 'https://test.com',
+		'SERVERPUSHKEY': 'key',
+	}
+	with patch.dict(os.environ, env, clear=True), NotificationKit() as kit:
+		assert {name: getattr(kit, name) for name in ALL_CHANNELS_CONFIG} == ALL_CHANNELS_CONFIG
 
-	notification_kit.send_wecom('测试标题', '测试内容')
 
-	mock_client.post.assert_called_once()
-	args = mock_client.post.call_args[1]
-	assert args['json']['msgtype'] == 'text'
+@patch('notify.smtplib.SMTP_SSL')
+def test_send_email(mock_smtp_ssl, make_kit):
+	notification_kit = make_kit(**EMAIL_CONFIG)
+	mock_server = mock_smtp_ssl.return_value
 
+	notification_kit.send_email('测试标题', '测试内容')
 
-def test_missing_config():
-	os.environ.clear()
-	kit = NotificationKit()
+	assert mock_server.login.called
+	assert mock_server.send_message.called
 
-	with pytest.raises(ValueError, match='未配置邮箱信息'):
-		kit.send_email('测试', '测试')
 
-	with pytest.raises(ValueError, match='未配置息知 Key'):
-		kit.send_xizhi('测试', '测试')
+@pytest.mark.parametrize(
+	'attr,value,method,url,payload',
+	[
+		(
+			'xizhi_key',
+			'test_key',
+			'send_xizhi',
+			'https://xizhi.qqoq.net/test_key.send',
+			{'title': 't', 'content': 'c'},
+		),
+		(
+			'server_push_key',
+			'test_key',
+			'send_serverPush',
+			'https://sctapi.ftqq.com/test_key.send',
+			{'title': 't', 'desp': 'c'},
+		),
+		(
+			'dingding_webhook',
+			'https://oapi.dingtalk.com/robot/test',
+			'send_dingtalk',
+			'https://oapi.dingtalk.com/robot/test',
+			{'msgtype': 'text', 'text': {'content': 't\nc'}},
+		),
+		(
+			'feishu_webhook',
+			'https://open.feishu.cn/open-apis/bot/v2/test',
+			'send_feishu',
+			'https://open.feishu.cn/open-apis/bot/v2/test',
+			{
+				'msg_type': 'interactive',
+				'card': {
+					'elements': [{'tag': 'markdown', 'content': 'c', 'text_align': 'left'}],
+					'header': {'template': 'blue', 'title': {'content': 't', 'tag': 'plain_text'}},
+				},
+			},
+		),
+		(
+			'weixin_webhook',
+			'https://qyapi.weixin.qq.com/test',
+			'send_wecom',
+			'https://qyapi.weixin.qq.com/test',
+			{'msgtype': 'text', 'text': {'content': 't\nc'}},
+		),
+	],
+)
+def test_send_webhook(make_kit, sent_requests, attr, value, method, url, payload):
+	notification_kit = make_kit(**{attr: value})
+
+	getattr(notification_kit, method)('t', 'c')
+
+	assert len(sent_requests) == 1
+	request = sent_requests[-1]
+	assert request.method == 'POST'
+	assert str(request.url) == url
+	assert json.loads(request.content) == payload
+
+
+def test_client_is_shared_and_closed_on_exit(make_kit, sent_requests):
+	with make_kit(
+		dingding_webhook='https://oapi.dingtalk.com/robot/test', weixin_webhook='https://qyapi.weixin.qq.com/test'
+	) as notification_kit:
+		notification_kit.send_dingtalk('测试标题', '测试内容')
+		notification_kit.send_wecom('测试标题', '测试内容')
+		client = notification_kit._client
+
+	assert [str(request.url) for request in sent_requests] == [
+		'https://oapi.dingtalk.com/robot/test',
+		'https://qyapi.weixin.qq.com/test',
+	]
+	assert client.is_closed
+
+
+@pytest.mark.parametrize(
+	'method,match',
+	[
+		('send_email', re.compile('未配置邮箱信息')),
+		('send_xizhi', re.compile('未配置息知 Key')),
+		('send_serverPush', re.compile('未配置 Server酱 Key')),
+		('send_dingtalk', re.compile('未配置钉钉 Webhook')),
+		('send_feishu', re.compile('未配置飞书 Webhook')),
+		('send_wecom', re.compile('未配置企业微信 Webhook')),
+	],
+)
+def test_missing_config(make_kit, sent_requests, method, match):
+	kit = make_kit()
+
+	with pytest.raises(ValueError, match=match):
+		getattr(kit, method)('测试', '测试')
+
+	assert not sent_requests
 
 
 @patch('notify.NotificationKit.send_email')
@@ -170,18 +202,8 @@ def test_missing_config():
 @patch('notify.NotificationKit.send_xizhi')
 @patch('notify.NotificationKit.send_feishu')
 @patch('notify.NotificationKit.send_serverPush')
-def test_push_message(mock_server_push, mock_feishu, mock_xizhi, mock_wecom, mock_dingtalk, mock_email):
-	# 设置所有通知配置
-	os.environ['EMAIL_USER'] = 'test@example.com'
-	os.environ['EMAIL_PASS'] = 'password'
-	os.environ['EMAIL_TO'] = 'recipient@example.com'
-	os.environ['DINGDING_WEBHOOK'] = 'https://test.com'
-	os.environ['WEIXIN_WEBHOOK'] = 'https://test.com'
-	os.environ['XIZHI_KEY'] = 'key'
-	os.environ['FEISHU_WEBHOOK'] = 'https://test.com'
-	os.environ['SERVERPUSHKEY'] = 'key'
-
-	notification_kit = NotificationKit()
+def test_push_message(mock_server_push, mock_feishu, mock_xizhi, mock_wecom, mock_dingtalk, mock_email, make_kit):
+	notification_kit = make_kit(**ALL_CHANNELS_CONFIG)
 	notification_kit.push_message('测试标题', '测试内容')
 
 	assert mock_email.called
@@ -195,6 +217,32 @@ def test_push_message(mock_server_push, mock_feishu, mock_xizhi, mock_wecom, moc
 	assert mock_feishu.call_args[0][2] == 'markdown'
 
 
+@patch('notify.NotificationKit.send_dingtalk')
+@patch('notify.NotificationKit.send_wecom')
+@patch('notify.NotificationKit.send_feishu')
+def test_push_message_failure_does_not_block_other_channels(mock_feishu, mock_wecom, mock_dingtalk, make_kit):
+	notification_kit = make_kit(
+		dingding_webhook='https://test.com', weixin_webhook='https://test.com', feishu_webhook='https://test.com'
+	)
+	mock_dingtalk.side_effect = RuntimeError('boom')
+
+	notification_kit.push_message('测试标题', '测试内容')
+
+	assert mock_dingtalk.called
+	assert mock_wecom.called
+	assert mock_feishu.called
+
+
+@patch('notify.NotificationKit.send_email')
+@patch('notify.NotificationKit.send_xizhi')
+def test_push_message_skips_unconfigured_channels(mock_xizhi, mock_email, make_kit):
+	notification_kit = make_kit(xizhi_key='key')
+	notification_kit.push_message('测试标题', '测试内容')
+
+	assert mock_xizhi.called
+	assert not mock_email.called
+
+
 @patch('notify.NotificationKit.send_email')
 @patch('notify.NotificationKit.send_dingtalk')
 @patch('notify.NotificationKit.send_wecom')
@@ -202,18 +250,9 @@ def test_push_message(mock_server_push, mock_feishu, mock_xizhi, mock_wecom, moc
 @patch('notify.NotificationKit.send_feishu')
 @patch('notify.NotificationKit.send_serverPush')
 def test_push_message_prefers_explicit_plain_text_for_non_html_channels(
-	mock_server_push, mock_feishu, mock_xizhi, mock_wecom, mock_dingtalk, mock_email
+	mock_server_push, mock_feishu, mock_xizhi, mock_wecom, mock_dingtalk, mock_email, make_kit
 ):
-	os.environ['EMAIL_USER'] = 'test@example.com'
-	os.environ['EMAIL_PASS'] = 'password'
-	os.environ['EMAIL_TO'] = 'recipient@example.com'
-	os.environ['DINGDING_WEBHOOK'] = 'https://test.com'
-	os.environ['WEIXIN_WEBHOOK'] = 'https://test.com'
-	os.environ['XIZHI_KEY'] = 'key'
-	os.environ['FEISHU_WEBHOOK'] = 'https://test.com'
-	os.environ['SERVERPUSHKEY'] = 'key'
-
-	notification_kit = NotificationKit()
+	notification_kit = make_kit(**ALL_CHANNELS_CONFIG)
 	html_content = '<div><h1>签到结果通知</h1><p>这是 HTML 内容</p></div>'
 	plain_text = '执行时间: 2026-03-29 00:00:00 (北京时间)\n\n[成功] 账号 1'
 	notification_kit.push_message('测试标题', html_content, msg_type='html', text_content=plain_text)